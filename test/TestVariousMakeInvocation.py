@@ -11,12 +11,14 @@ import subprocess
 import tempfile
 import sys
 import textwrap
+import re
 import string
 import errno
 import time
 import signal
 import psutil
 import multiprocessing
+import distutils.spawn
 
 def wait_for_condition(cond, true_count=1, max_retries=None, sleep_time=0.1 ):
     retry = 0
@@ -160,6 +162,15 @@ class Test(unittest.TestCase):
             self.assertFalse("Found unexpected file: {} in dir: {}".format(
                 found_file, d))
 
+    def check_no_scratch_dirs(self, scratch_root):
+        """Verify that the per test scratch directories created under
+        scratch_root have all been removed"""
+
+        left_behind = os.listdir(scratch_root)
+        if len(left_behind) != 0:
+            self.assertFalse("Found unexpected scratch dirs: {} in dir: {}".format(
+                left_behind, scratch_root))
+
     def check_return_value(self, rv, expected_rv):
         """If expected_rv is zero, return value must be zero.
         If expected_outpus is non_zero, then the return value must be non_zero"""
@@ -225,6 +236,7 @@ class Test(unittest.TestCase):
         env.pop("FIRST_MAKEFILE", None)
         env.pop("FIRST_MAKEFILE_DIR", None)
         env.pop("TEST_TARGETS", None)
+        env.pop("SCRATCH_ROOT", None)
 
 	return env
 
@@ -243,6 +255,12 @@ class Test(unittest.TestCase):
         # the parent makefile did on the environment.
         env = Test.get_clean_env()
 
+        # Let the tests create their scratch dirs in a dir we can inspect
+        # afterwards.
+        scratch_root = os.path.join(parent_dir, "scratch")
+        Test.make_dirs_ignore_existing(scratch_root)
+        env["SCRATCH_ROOT"] = scratch_root
+
         descendent_sleep_pids = None
 
         def in_new_pgrp():
@@ -311,6 +329,7 @@ class Test(unittest.TestCase):
         if check_intermediate_files == Test.do_check:
             self.check_no_intermediate_files(parent_dir)
             self.check_no_intermediate_files(run_dir)
+        self.check_no_scratch_dirs(scratch_root)
 
         if descendent_sleep_pids != None:
             # If we had any sleep processes, then they must have disappered by now.
@@ -589,6 +608,38 @@ class Test(unittest.TestCase):
                 Test.sigint,
                 Test.skip_check)
 
+    def test_keep_scratch_on_failure(self):
+        """Verify that with KEEP_SCRATCH_ON_FAILURE=1 the scratch dir of a failed
+        test is left behind and the scratch dir of a passed test is removed"""
+
+        with TempDir() as td:
+            d = td.dir()
+            Test.copy_makefile_test_to(d)
+            Test.populate_test_dir(d, ["passing_test.sh", "failing_test.sh"],
+                Test.same_dir)
+
+            scratch_root = os.path.join(d, "scratch")
+            Test.make_dirs_ignore_existing(scratch_root)
+
+            env = Test.get_clean_env()
+            env["SCRATCH_ROOT"] = scratch_root
+            env["KEEP_SCRATCH_ON_FAILURE"] = "1"
+
+            p = subprocess.Popen(["make", "-j"],
+                cwd=d,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE)
+            out, err = p.communicate()
+            logging.debug(out)
+            logging.debug(err)
+
+            self.check_return_value(p.returncode, 2)
+            self.check_output(out,
+                "Scratch directory of failing_test.sh kept at: " + scratch_root)
+            self.assertEqual(len(os.listdir(scratch_root)), 1)
+            self.check_no_intermediate_files(d)
+
     @staticmethod
     def descendant_sleep_process_count(pid):
         """Count the number of descendant sleep processes of the given pid"""
@@ -657,6 +708,52 @@ class Test(unittest.TestCase):
             ["indefinite_test.sh", "indefinite_test1.sh"],
             1)
 
+    @unittest.skipIf(distutils.spawn.find_executable("inotifywait") is None,
+        "inotifywait is not installed, make watch is not supported.")
+    def test_make_watch(self):
+        """Verify that make watch reruns only the test that has changed and that
+        CTRL-C leaves no intermediate files behind"""
+
+        with TempDir() as td:
+            d = td.dir()
+            Test.copy_makefile_test_to(d)
+            Test.populate_test_dir(d, ["passing_test.sh", "failing_test.sh"],
+                Test.same_dir)
+
+            env = Test.get_clean_env()
+            def in_new_pgrp():
+                os.setpgrp()
+                return
+
+            with tempfile.TemporaryFile() as out:
+                p = subprocess.Popen(["make", "watch"],
+                    cwd=d,
+                    env=env,
+                    stdout=out,
+                    stderr=subprocess.STDOUT,
+                    preexec_fn=in_new_pgrp)
+
+                def passing_test_rerun():
+                    # Keep touching the test until the watches are established
+                    # and the rerun shows up in the output.
+                    os.utime(os.path.join(d, "passing_test.sh"), None)
+                    time.sleep(1)
+                    out.seek(0)
+                    return re.search("All\s*1 tests passed", out.read()) != None
+
+                wait_for_condition(passing_test_rerun, max_retries=30)
+
+                os.killpg(p.pid, signal.SIGINT)
+                p.wait()
+
+                out.seek(0)
+                output = out.read()
+                logging.debug(output)
+
+            self.check_return_value(p.returncode, -signal.SIGINT)
+            self.assertNotIn("failing_test.sh", output)
+            self.check_no_intermediate_files(d)
+
 
 if __name__ == '__main__':
     Test.initLog(logging.DEBUG)